@@ -1,11 +1,13 @@
 import os
+import atexit
 import logging
-import json
 import sqlite3
+import orjson
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from research_agent import ResearchAgent
+from research_agent import ResearchAgent, find_urls
+from cache import SqliteAnswerCache
 
 # Configure logging
 logging.basicConfig(
@@ -48,7 +50,7 @@ def save_research_query(query, result=None, status='success', error_message=None
         cursor.execute('''
             INSERT INTO research_queries (query, result, status, error_message)
             VALUES (?, ?, ?, ?)
-        ''', (query, json.dumps(result) if result else None, status, error_message))
+        ''', (query, orjson.dumps(result).decode() if result else None, status, error_message))
         conn.commit()
         conn.close()
         logger.info(f"Research query saved to database: {query}")
@@ -57,7 +59,8 @@ def save_research_query(query, result=None, status='success', error_message=None
 
 # Initialize ResearchAgent
 try:
-    research_agent = ResearchAgent()
+    research_agent = ResearchAgent(cache=SqliteAnswerCache('answer_cache.db'))
+    atexit.register(research_agent.close)
     logger.info("ResearchAgent initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize ResearchAgent: {e}")
@@ -137,7 +140,7 @@ def test_serpapi():
         # Test with a simple search
         test_query = "test"
         logger.info(f"Testing SerpAPI with query: {test_query}")
-        result = research_agent.search.run(test_query)
+        result = research_agent.search_serpapi(test_query)
         
         return jsonify({
             "status": "serpapi_working",
@@ -167,12 +170,11 @@ def debug_research():
     try:
         # Perform search only
         logger.info(f"Debug: Performing search for: {query}")
-        search_results = research_agent.search.run(query)
+        search_results = research_agent.search_web(query)
         
         # Process with LLM
         logger.info("Debug: Processing with LLM...")
-        chain = LLMChain(llm=research_agent.llm, prompt=research_agent.research_prompt_template)
-        raw_output = chain.run(query=query, search_results=search_results)
+        raw_output = research_agent.chain.invoke({"query": query, "search_results": search_results})
         
         # Extract text content
         if hasattr(raw_output, 'content'):
@@ -209,12 +211,10 @@ def debug_urls():
     try:
         # Perform search only
         logger.info(f"Debug URLs: Performing search for: {query}")
-        search_results = research_agent.search.run(query)
+        search_results = research_agent.search_web(query)
         
         # Extract URLs from search results
-        import re
-        url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+(?:[^\s<>"{}|\\^`\[\]]*[a-zA-Z0-9])?'
-        found_urls = re.findall(url_pattern, str(search_results))
+        found_urls = find_urls(str(search_results))
         
         # Remove duplicates
         unique_urls = []
@@ -312,6 +312,52 @@ def research():
             "query": query
         }), 500
 
+@app.route('/research/stream', methods=['GET'])
+def research_stream():
+    """
+    Streaming research endpoint using server-sent events.
+    
+    Query Parameters:
+    - query (required): The research query string
+    
+    Returns:
+    - text/event-stream of {"done": bool, "result": {...}} events; partial results
+      are sent as each section of the note arrives, the final event has done=true
+    """
+    query = request.args.get('query')
+    
+    if not query or not query.strip():
+        logger.warning("Research stream endpoint called without a query")
+        return jsonify({
+            "error": "Query parameter is required.",
+            "usage": "GET /research/stream?query=your_research_query"
+        }), 400
+
+    if not research_agent:
+        error_msg = "Research agent not initialized. Check backend logs for details."
+        logger.error(error_msg)
+        save_research_query(query, status='error', error_message=error_msg)
+        return jsonify({"error": error_msg}), 500
+
+    logger.info(f"Received streamed research query: {query}")
+
+    def generate():
+        try:
+            for event in research_agent.stream_research(query):
+                if event["done"]:
+                    save_research_query(query, event["result"])
+                yield f"data: {orjson.dumps(event).decode()}\n\n"
+        except Exception as e:
+            error_msg = f"Failed to perform research: {str(e)}"
+            logger.error(f"Error streaming research query '{query}': {e}")
+            save_research_query(query, status='error', error_message=error_msg)
+            yield f"event: error\ndata: {orjson.dumps({'error': 'Failed to perform research.', 'details': str(e)}).decode()}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/history', methods=['GET'])
 def get_research_history():
     """
@@ -345,7 +391,7 @@ def get_research_history():
             history.append({
                 "id": row[0],
                 "query": row[1],
-                "result": json.loads(row[2]) if row[2] else None,
+                "result": orjson.loads(row[2]) if row[2] else None,
                 "created_at": row[3],
                 "status": row[4],
                 "error_message": row[5]
@@ -414,6 +460,7 @@ def root():
         "available_endpoints": [
             "GET /health",
             "GET /research?query=<your_query>",
+            "GET /research/stream?query=<your_query>",
             "GET /history?limit=<number>&offset=<number>",
             "GET /stats"
         ]
@@ -426,6 +473,7 @@ def not_found(error):
         "available_endpoints": [
             "GET /health",
             "GET /research?query=<your_query>",
+            "GET /research/stream?query=<your_query>",
             "GET /history?limit=<number>&offset=<number>",
             "GET /stats"
         ]
@@ -0,0 +1,314 @@
+import logging
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import hnswlib
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+DEFAULT_INDEX_CAPACITY = 1024
+# Expired rows are purged on put at most this often
+DEFAULT_PURGE_INTERVAL = 60 * 60
+# Nearest neighbours checked so an expired row does not hide a valid one
+SEMANTIC_CANDIDATES = 4
+
+# Semantic hits must also share this much of their content vocabulary
+MIN_TOKEN_JACCARD = 0.5
+_TOKEN_RE = re.compile(r'[a-z]{3,}')
+STOPWORDS = frozenset([
+    "about", "after", "and", "are", "before", "between", "but", "can", "does",
+    "for", "from", "has", "have", "how", "into", "latest", "new", "not", "of",
+    "recent", "that", "the", "their", "there", "this", "was", "were", "what",
+    "when", "where", "which", "who", "why", "will", "with", "you", "your",
+])
+
+
+def cache_key(query: str) -> str:
+    """Build the cache key for a query from its normalized text."""
+    return hashlib.sha256(query.strip().lower().encode("utf-8")).hexdigest()
+
+
+def content_tokens(text: str) -> frozenset:
+    """Return the lowercase content words of a text, without stopwords."""
+    return frozenset(_TOKEN_RE.findall(text.lower())) - STOPWORDS
+
+
+def verify_semantic_match(query: str, cached_query: str, cached_result: Dict) -> bool:
+    """
+    Check that an embedding-similar cached result really answers the query.
+
+    Embedding similarity alone matches queries that share phrasing but differ
+    in subject, so the two queries must also have a token-set Jaccard
+    similarity of at least MIN_TOKEN_JACCARD, and the cached title must share
+    at least one content word with the query.
+    """
+    query_tokens = content_tokens(query)
+    cached_tokens = content_tokens(cached_query)
+    union = query_tokens | cached_tokens
+    if not union or len(query_tokens & cached_tokens) / len(union) < MIN_TOKEN_JACCARD:
+        return False
+    return bool(query_tokens & content_tokens(cached_result.get("title", "")))
+
+
+class SemanticIndex:
+    """
+    Approximate nearest-neighbour index over query embeddings.
+
+    Wraps an hnswlib HNSW graph in cosine space so top-1 lookups stay fast
+    regardless of how many queries are cached. Items are identified by
+    integer labels chosen by the caller. The index is created on the first
+    add, using that embedding's dimension, and grows as needed.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_INDEX_CAPACITY):
+        self.capacity = capacity
+        self._index = None
+        self._live = 0
+        self._deleted = 0
+        self._lock = threading.Lock()
+
+    def add(self, embedding: np.ndarray, label: int) -> None:
+        """Add an embedding under the given label."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            if self._index is None:
+                self._index = hnswlib.Index(space='cosine', dim=vector.shape[1])
+                self._index.init_index(max_elements=self.capacity, M=16, ef_construction=200,
+                                       allow_replace_deleted=True)
+                self._index.set_ef(50)
+            if self._deleted:
+                self._deleted -= 1
+            elif self._index.get_current_count() >= self._index.get_max_elements():
+                self._index.resize_index(2 * self._index.get_max_elements())
+            self._index.add_items(vector, [label], replace_deleted=True)
+            self._live += 1
+
+    def remove(self, label: int) -> None:
+        """Remove the embedding stored under the given label."""
+        with self._lock:
+            self._index.mark_deleted(label)
+            self._live -= 1
+            self._deleted += 1
+
+    def nearest(self, embedding: np.ndarray) -> Optional[Tuple[int, float]]:
+        """Return the label and cosine similarity of the closest embedding."""
+        matches = self.search(embedding, k=1)
+        return matches[0] if matches else None
+
+    def search(self, embedding: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (label, cosine similarity) pairs, closest first."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            if not self._live:
+                return []
+            labels, distances = self._index.knn_query(vector, k=min(k, self._live))
+        return [(int(label), 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+
+
+class SqliteAnswerCache:
+    """
+    Research result cache backed by SQLite so it can be shared between
+    processes (gunicorn workers, CLI runs).
+
+    Results are looked up by normalized query and, when an embedding is
+    supplied, by cosine similarity to previously cached queries. Rows older
+    than the TTL are ignored, and removed by clear_expired, which runs at
+    startup and then from put at most every purge_interval seconds.
+    """
+
+    def __init__(self, db_path: str = "answer_cache.db", ttl: int = DEFAULT_TTL,
+                 similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 purge_interval: int = DEFAULT_PURGE_INTERVAL):
+        """Open the cache database, purge expired rows and load cached embeddings."""
+        self.db_path = db_path
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.purge_interval = purge_interval
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "verified_rejects": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._init_db()
+        self.clear_expired()
+
+    def _init_db(self):
+        """Create the cache table if it does not exist."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                embedding BLOB,
+                result_json TEXT NOT NULL,
+                created_at INTEGER NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        conn.commit()
+        conn.close()
+        logger.info(f"Answer cache initialized at {self.db_path}")
+
+    def _init_index(self):
+        """Reset the in-memory semantic index."""
+        self._index = SemanticIndex()
+        self._keys: Dict[int, str] = {}
+        self._labels: Dict[str, int] = {}
+        self._next_label = 0
+
+    def _load_embeddings(self):
+        """Index embeddings of unexpired rows for the semantic lookup."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT key, embedding FROM answer_cache
+            WHERE embedding IS NOT NULL AND created_at >= ?
+        ''', (self._oldest_valid(),))
+        rows = cursor.fetchall()
+        conn.close()
+
+        for key, blob in rows:
+            self._index_embedding(key, np.frombuffer(blob, dtype=np.float32))
+        logger.info(f"Loaded {len(rows)} cached embeddings")
+
+    def _oldest_valid(self) -> int:
+        """Return the creation time of the oldest row still within the TTL."""
+        return int(time.time()) - self.ttl
+
+    def get(self, query: str, embedding: Optional[np.ndarray] = None) -> Optional[Dict]:
+        """Return the cached result for a query, or None on a miss."""
+        try:
+            key = cache_key(query)
+            row = self._fetch(key)
+            if row is not None:
+                self._record_hit(key)
+                self._count("exact_hits")
+                return row[1]
+
+            if embedding is not None:
+                for key in self._nearest_keys(embedding):
+                    row = self._fetch(key)
+                    if row is None:
+                        self._forget(key)
+                        continue
+                    cached_query, result = row
+                    if verify_semantic_match(query, cached_query, result):
+                        self._record_hit(key)
+                        self._count("semantic_hits")
+                        return result
+                    self._count("verified_rejects")
+                    break
+
+            self._count("misses")
+            return None
+
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None
+
+    def put(self, query: str, embedding: Optional[np.ndarray], result: Dict) -> None:
+        """Store a research result, replacing any existing entry for the query."""
+        try:
+            key = cache_key(query)
+            blob = None
+            if embedding is not None:
+                embedding = np.asarray(embedding, dtype=np.float32)
+                blob = embedding.tobytes()
+
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO answer_cache (key, query, embedding, result_json, created_at, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+            ''', (key, query, blob, orjson.dumps(result).decode(), int(time.time())))
+            conn.commit()
+            conn.close()
+
+            if embedding is not None:
+                self._index_embedding(key, embedding)
+
+            if time.time() - self._last_purge >= self.purge_interval:
+                self.clear_expired()
+
+        except Exception as e:
+            logger.warning(f"Failed to store result in answer cache: {e}")
+
+    def clear_expired(self) -> int:
+        """Delete rows older than the TTL and return how many were removed."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM answer_cache WHERE created_at < ?', (self._oldest_valid(),))
+        removed = cursor.rowcount
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            self._init_index()
+            self._last_purge = time.time()
+        self._load_embeddings()
+        return removed
+
+    def _count(self, name: str) -> None:
+        """Increment one of the stats counters."""
+        with self._lock:
+            self.stats[name] += 1
+
+    def _index_embedding(self, key: str, embedding: np.ndarray) -> None:
+        """
+        Add or replace the indexed embedding for a key.
+        
+        hnswlib cannot re-add a deleted label, so a replaced key gets a fresh
+        label and the old one is forgotten.
+        """
+        with self._lock:
+            old_label = self._labels.get(key)
+            if old_label is not None:
+                self._index.remove(old_label)
+                del self._keys[old_label]
+            label = self._next_label
+            self._next_label += 1
+            self._keys[label] = key
+            self._labels[key] = label
+            self._index.add(embedding, label)
+
+    def _forget(self, key: str) -> None:
+        """Drop the indexed embedding of a key whose row expired or was deleted."""
+        with self._lock:
+            label = self._labels.pop(key, None)
+            if label is not None:
+                self._index.remove(label)
+                del self._keys[label]
+
+    def _fetch(self, key: str) -> Optional[Tuple[str, Dict]]:
+        """Fetch the query and result of an unexpired row by key."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT query, result_json FROM answer_cache
+            WHERE key = ? AND created_at >= ?
+        ''', (key, self._oldest_valid()))
+        row = cursor.fetchone()
+        conn.close()
+        return (row[0], orjson.loads(row[1])) if row else None
+
+    def _record_hit(self, key: str) -> None:
+        """Increment the hit counter of a row."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('UPDATE answer_cache SET hits = hits + 1 WHERE key = ?', (key,))
+        conn.commit()
+        conn.close()
+
+    def _nearest_keys(self, embedding: np.ndarray) -> List[str]:
+        """Return the keys of the closest cached queries above the threshold, closest first."""
+        with self._lock:
+            matches = self._index.search(embedding, SEMANTIC_CANDIDATES)
+            return [
+                self._keys[label] for label, similarity in matches
+                if similarity >= self.similarity_threshold and label in self._keys
+            ]
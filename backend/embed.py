@@ -0,0 +1,61 @@
+import logging
+import threading
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+_MODEL = None
+_LOADED = False
+_LOCK = threading.Lock()
+
+
+def get_embedder():
+    """
+    Return the process-wide query embedding model, loading it on first use.
+
+    The model is shared by every ResearchAgent so it is only loaded once per
+    worker. Returns None if sentence-transformers is not installed or the
+    model cannot be loaded, in which case the semantic cache is disabled.
+    """
+    global _MODEL, _LOADED
+    if not _LOADED:
+        with _LOCK:
+            if not _LOADED:
+                _MODEL = _load_embedder()
+                _LOADED = True
+    return _MODEL
+
+
+def _load_embedder():
+    """
+    Load the embedding model with the fastest available backend.
+
+    ONNX Runtime is preferred on CPU; otherwise the PyTorch model is used,
+    converted to FP16 when running on a GPU.
+    """
+    if SentenceTransformer is None:
+        logger.warning("sentence-transformers not installed, semantic cache disabled")
+        return None
+
+    try:
+        model = SentenceTransformer(EMBEDDING_MODEL, device="cpu", backend="onnx")
+        logger.info(f"Loaded embedding model {EMBEDDING_MODEL} with ONNX Runtime")
+        return model
+    except Exception as e:
+        logger.info(f"ONNX Runtime backend unavailable, using PyTorch: {e}")
+
+    try:
+        model = SentenceTransformer(EMBEDDING_MODEL)
+        if model.device.type == "cuda":
+            model.half()
+        logger.info(f"Loaded embedding model {EMBEDDING_MODEL} on {model.device}")
+        return model
+    except Exception as e:
+        logger.warning(f"Failed to load embedding model, semantic cache disabled: {e}")
+        return None
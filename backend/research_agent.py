@@ -1,13 +1,24 @@
 import os
+import asyncio
 import logging
-import json
+import threading
 import re
-from typing import Dict, List, Optional
+import copy
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
 from dotenv import load_dotenv
-from langchain_community.utilities import SerpAPIWrapper
-from langchain_core.prompts import PromptTemplate
+from pydantic import BaseModel, Field, ValidationError
+from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import StrOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
+from google import genai
+from cache import SemanticIndex, SqliteAnswerCache, cache_key, verify_semantic_match
+from embed import get_embedder
+from search_client import SerpAPIClient
 
 # Load environment variables from .env file
 load_dotenv()
@@ -16,18 +27,196 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+GEMINI_MODEL = "gemini-1.5-flash-latest"
+# A full research note (title, summary, five key points, a few sources) fits well within this
+MAX_OUTPUT_TOKENS = 800
+
+# Gemini batch job settings
+BATCH_POLL_INTERVAL = 30
+BATCH_TIMEOUT = 24 * 60 * 60
+BATCH_COMPLETED_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+
+# URL extraction patterns
+_URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+_DOMAIN_RE = re.compile(r'https?://(?:www\.)?([^/]+)')
+_VALID_URL_RE = re.compile(r'^https?://[^\s<>"{}|\\^`\[\]]+\.[a-zA-Z]{2,}')
+_BAD_URL_TOKENS = ('example.com', 'placeholder', 'no%20url')
+
+# Research note section headers, matched case-insensitively at line start
+_SECTION_TOKENS = {
+    "TITLE:": "title",
+    "SUMMARY:": "summary",
+    "KEY POINTS:": "key_points",
+    "SOURCES:": "sources",
+}
+_STOP_TOKENS = ("IMPORTANT GUIDELINES:", "CRITICAL")
+_SECTION_HEAD_LEN = max(len(token) for token in (*_SECTION_TOKENS, *_STOP_TOKENS))
+
+# Search results injected into the prompt are capped to keep input tokens down
+MAX_SEARCH_HITS = 10
+MAX_SEARCH_RESULTS_CHARS = 4000
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Slow backends are abandoned so one hung search cannot stall the request
+SEARCH_BACKEND_TIMEOUT = 10
+
+# Response cache settings
+SEMANTIC_CACHE_THRESHOLD = 0.92
+CACHE_MAX_ENTRIES = 256
+
+
+def find_urls(text: str) -> List[str]:
+    """
+    Find all http(s) URLs in text.
+    
+    A URL starts at "http://" or "https://" and runs until whitespace or one
+    of the characters that cannot appear unescaped in a URL.
+    """
+    return _URL_RE.findall(text)
+
+
+def _format_hit(hit: Dict) -> str:
+    """Render a search hit as "title - snippet - link", skipping missing fields."""
+    fields = (hit.get("title", ""), hit.get("snippet", ""), hit.get("link", ""))
+    return " - ".join(str(field) for field in fields if field)
+
+
+class _NoteStream:
+    """
+    Accumulates streamed LLM output line by line.
+    
+    Output is cut off at the first line starting with a stop token, since
+    everything after it is the model echoing the prompt instructions.
+    """
+    
+    def __init__(self):
+        self._lines = []
+        self._partial = ""
+        self.stopped = False
+    
+    def feed(self, chunk: str) -> bool:
+        """Add a streamed chunk. Returns True if a new section header completed."""
+        self._partial += chunk
+        *complete, self._partial = self._partial.split("\n")
+        
+        new_section = False
+        for line in complete:
+            head = line.strip()[:_SECTION_HEAD_LEN].upper()
+            if head.startswith(_STOP_TOKENS):
+                self.stopped = True
+                self._partial = ""
+                break
+            if head.startswith(tuple(_SECTION_TOKENS)):
+                new_section = True
+            self._lines.append(line)
+        return new_section
+    
+    @property
+    def text(self) -> str:
+        """The output received so far, up to any stop token."""
+        return "\n".join(self._lines + [self._partial])
+
+
+class Source(BaseModel):
+    """A cited source in a research note."""
+    title: str = Field(description="Actual article or page title from the search results")
+    url: str = Field(description="URL copied exactly from the search results")
+
+
+class ResearchNote(BaseModel):
+    """Structured research note returned by the LLM."""
+    title: str = Field(description="A clear title for the research note")
+    summary: str = Field(description="3-5 sentences summarizing the key findings")
+    key_points: List[str] = Field(description="Five key points from the search results")
+    sources: List[Source] = Field(description="At least 3 sources with real URLs from the search results")
+
+
 class ResearchAgent:
     """
     AI Research Assistant that combines web search with LLM processing
     to generate structured research notes with citations.
     """
     
-    def __init__(self):
-        """Initialize the research agent with LLM and search tools."""
+    def __init__(self, cache: Optional[SqliteAnswerCache] = None):
+        """
+        Initialize the research agent with LLM and search tools.
+        
+        An optional SqliteAnswerCache shares results with other processes.
+        """
+        self.cache = cache
+        self._initialize_event_loop()
         self._initialize_llm()
         self._initialize_search_tools()
         self._initialize_prompts()
+        self._initialize_cache()
+        self._start_warmup()
         
+    def _initialize_event_loop(self):
+        """
+        Start the event loop that runs all of the agent's async work.
+        
+        The loop lives on a daemon thread for the agent's lifetime, so HTTP
+        sessions and async clients bound to it are reused across requests
+        instead of being recreated by a fresh asyncio.run per call.
+        """
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="research-agent-loop", daemon=True)
+        self._loop_thread.start()
+
+    def _run_sync(self, coro):
+        """Run a coroutine on the agent's event loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _run_on_loop(self, coro):
+        """
+        Await a coroutine on the agent's event loop from any event loop.
+        
+        The SerpAPI session and Gemini async clients are bound to the agent
+        loop, so callers on another loop have their work forwarded to it.
+        """
+        if asyncio.get_running_loop() is self._loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def close(self) -> None:
+        """Close the SerpAPI session and stop the agent's event loop."""
+        if self._loop.is_closed():
+            return
+        
+        try:
+            self._run_sync(self.search.close())
+        except Exception as e:
+            logger.warning(f"Failed to close SerpAPI session: {e}")
+        
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+
+    def _start_warmup(self):
+        """
+        Warm the Gemini and SerpAPI connections in the background.
+        
+        The first request in a fresh process otherwise pays for DNS and the
+        TLS handshake. Construction does not wait for the warmup to finish.
+        """
+        self._warmup_future = asyncio.run_coroutine_threadsafe(self._warmup(), self._loop)
+
+    async def _warmup(self):
+        """Make a one-token Gemini call and open a SerpAPI connection, ignoring failures."""
+        ping = self.llm.bind(generation_config={"max_output_tokens": 1})
+        for name, warm in (("Gemini", lambda: ping.ainvoke("ping")),
+                           ("SerpAPI", self.search.warmup)):
+            try:
+                await warm()
+                logger.info(f"Warmed {name} connection")
+            except Exception as e:
+                logger.warning(f"{name} warmup failed: {e}")
+
     def _initialize_llm(self):
         """Initialize the Google Gemini language model."""
         google_api_key = os.getenv("GOOGLE_API_KEY")
@@ -40,10 +229,12 @@ class ResearchAgent:
         
         try:
             self.llm = ChatGoogleGenerativeAI(
-                model="gemini-1.5-flash-latest",
+                model=GEMINI_MODEL,
                 temperature=0.1,
+                max_output_tokens=MAX_OUTPUT_TOKENS,
                 google_api_key=google_api_key
             )
+            self.batch_client = genai.Client(api_key=google_api_key)
             logger.info("Initialized Google Gemini model")
         except Exception as e:
             logger.error(f"Failed to initialize Gemini model: {e}")
@@ -59,20 +250,29 @@ class ResearchAgent:
         logger.info(f"Found SerpAPI key: {serpapi_api_key[:10]}...")
         
         try:
-            self.search = SerpAPIWrapper(serpapi_api_key=serpapi_api_key)
+            self.search = SerpAPIClient(serpapi_api_key)
             logger.info("Initialized SerpAPI search tool")
         except Exception as e:
             logger.error(f"Failed to initialize SerpAPI: {e}")
             raise ValueError(f"Failed to initialize SerpAPI: {e}")
+        
+        self.search_backends: List[Callable[[str], Awaitable[List[Dict]]]] = [self._serp_search]
+        
+        try:
+            self.ddg_search = DuckDuckGoSearchAPIWrapper(max_results=MAX_SEARCH_HITS)
+            self.search_backends.append(self._ddg_search)
+            logger.info("Initialized DuckDuckGo search tool")
+        except Exception as e:
+            logger.warning(f"DuckDuckGo search unavailable, using SerpAPI only: {e}")
     
     def _initialize_prompts(self):
-        """Initialize prompt templates."""
-        self.research_prompt_template = PromptTemplate.from_template(
-            """You are a research assistant. Based on the search results below, create a research note.
-
-            QUERY: {query}
-
-            SEARCH RESULTS: {search_results}
+        """
+        Initialize prompt templates.
+        
+        The static instructions go in the system message so only the query and
+        search results change between calls.
+        """
+        self.research_system_prompt = """You are a research assistant. Based on the search results you are given, create a research note.
 
             Create a research note with exactly this format:
 
@@ -105,24 +305,162 @@ class ResearchAgent:
             - Include at least 3 sources with real URLs if available in search results
 
             Be specific and use information from the search results."""
-        )
+        self.research_user_prompt = "QUERY: {query}\n\nSEARCH RESULTS: {search_results}"
+        self.research_prompt_template = ChatPromptTemplate.from_messages([
+            ("system", self.research_system_prompt),
+            ("human", self.research_user_prompt),
+        ])
+        
+        # The structured chain gets its layout from the ResearchNote schema, so
+        # its prompt only carries the content and source rules
+        self.structured_system_prompt = """You are a research assistant. Based on the search results you are given, create a research note.
+
+            Write a clear title, a 3-5 sentence summary of the key findings and five key points.
+
+            SOURCE RULES:
+            - Each source has the actual article/page title from the search results and its URL
+            - URLs must be real web addresses (http:// or https://) copied exactly from the search results
+            - Do NOT number sources or add brackets to their titles
+            - Do NOT use placeholder text like "Source title" or "no url"
+            - Do NOT make up URLs - only use ones found in the search results
+            - Include at least 3 sources with real URLs if available in search results
+
+            Be specific and use information from the search results."""
+        self.structured_prompt_template = ChatPromptTemplate.from_messages([
+            ("system", self.structured_system_prompt),
+            ("human", self.research_user_prompt),
+        ])
+        
+        # Compose the LCEL chains once; they are reused by every request
+        self.chain = self.research_prompt_template | self.llm.bind(stop=list(_STOP_TOKENS)) | StrOutputParser()
+        self.structured_chain = self.structured_prompt_template | self.llm.with_structured_output(ResearchNote)
     
-    def run_research(self, query: str) -> Dict:
+    def _initialize_cache(self):
+        """
+        Initialize the exact-match and semantic response caches.
+        
+        The caches are used from both the agent loop and stream_research's
+        calling thread, so their state and counters are guarded by a lock.
+        """
+        self._cache_lock = threading.Lock()
+        self._exact_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._sem_index = SemanticIndex(capacity=CACHE_MAX_ENTRIES)
+        self._sem_results: "OrderedDict[int, Tuple[str, Dict]]" = OrderedDict()
+        self._next_label = 0
+        self.cache_stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "persistent_hits": 0,
+            "verified_rejects": 0,
+            "misses": 0,
+        }
+        self._embedder = get_embedder()
+    
+    def run_research(self, query: str, use_cache: bool = True) -> Dict:
         """
         Perform comprehensive research on a given query.
+        
+        Synchronous wrapper around arun_research.
+        """
+        return self._run_sync(self._arun_research(query, use_cache=use_cache))
+
+    def stream_research(self, query: str, use_cache: bool = True) -> Iterator[Dict]:
+        """
+        Perform research and yield partial results while the LLM output streams.
+        
+        Each event is {"done": bool, "result": Dict}. A partial result is yielded
+        whenever a new section starts; the final event carries the full note.
         """
+        if not query or not query.strip():
+            raise ValueError("Query cannot be empty")
+        
+        logger.info(f"Starting streamed research for query: {query}")
+        
+        embedding = None
+        if use_cache:
+            cached, embedding = self._cache_lookup(query)
+            if cached is not None:
+                yield {"done": True, "result": cached}
+                return
+        
+        search_results = self.search_web(query)
+        if not search_results or str(search_results).strip() == "":
+            logger.warning("No search results found")
+            yield {"done": True, "result": self._create_empty_result(query, "No search results found for this query.")}
+            return
+        
+        note = _NoteStream()
+        stream = self.chain.stream({"query": query, "search_results": search_results})
+        try:
+            for chunk in stream:
+                if note.feed(chunk):
+                    yield {"done": False, "result": self._parse_research_note(note.text)}
+                if note.stopped:
+                    break
+        finally:
+            stream.close()
+        
+        parsed_output = self._parse_research_note(note.text, search_results)
+        self._validate_research_output(parsed_output)
+        
+        if use_cache:
+            self._cache_store(query, embedding, parsed_output)
+        
+        logger.info(f"Streamed research completed for query: {query}")
+        yield {"done": True, "result": parsed_output}
+
+    def run_research_many(self, queries: List[str], max_concurrency: int = 4,
+                          use_cache: bool = True) -> List[Dict]:
+        """Synchronous wrapper around arun_research_many."""
+        return self._run_sync(self._arun_research_many(queries, max_concurrency, use_cache))
+
+    async def arun_research_many(self, queries: List[str], max_concurrency: int = 4,
+                                 use_cache: bool = True) -> List[Dict]:
+        """
+        Research several queries concurrently.
+        
+        At most max_concurrency searches and LLM calls are in flight at once.
+        Results are returned in the same order as the queries.
+        """
+        return await self._run_on_loop(self._arun_research_many(queries, max_concurrency, use_cache))
+
+    async def _arun_research_many(self, queries: List[str], max_concurrency: int,
+                                  use_cache: bool) -> List[Dict]:
+        """Research several queries concurrently on the agent loop."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def bounded(query: str) -> Dict:
+            async with semaphore:
+                return await self._arun_research(query, use_cache=use_cache)
+
+        return list(await asyncio.gather(*(bounded(query) for query in queries)))
+
+    async def arun_research(self, query: str, use_cache: bool = True) -> Dict:
+        """
+        Perform comprehensive research on a given query.
+        
+        Results are cached by normalized query and, when an embedding model is
+        available, by semantic similarity to previously answered queries.
+        Safe to await from any event loop.
+        """
+        return await self._run_on_loop(self._arun_research(query, use_cache=use_cache))
+
+    async def _arun_research(self, query: str, use_cache: bool = True) -> Dict:
+        """Perform research on the agent loop."""
         try:
             logger.info(f"Starting research for query: {query}")
             
             if not query or not query.strip():
                 raise ValueError("Query cannot be empty")
             
-            logger.info("Performing web search...")
-            search_results = self.search.run(query)
+            embedding = None
+            if use_cache:
+                cached, embedding = await asyncio.to_thread(self._cache_lookup, query)
+                if cached is not None:
+                    return cached
             
-            # Convert list to string if needed
-            if isinstance(search_results, list):
-                search_results = " ".join(str(item) for item in search_results)
+            logger.info("Performing web search...")
+            search_results = await self._search(query)
             
             logger.info(f"Search results length: {len(search_results) if search_results else 0}")
             
@@ -130,20 +468,20 @@ class ResearchAgent:
                 logger.warning("No search results found")
                 return self._create_empty_result(query, "No search results found for this query.")
             
-            # Store search_results for later use in parsing
-            self._current_search_results = search_results
-            
             logger.info(f"Search completed. Processing results with LLM...")
             
-            # Use LCEL (LangChain Expression Language) syntax
-            chain = self.research_prompt_template | self.llm | StrOutputParser()
-            raw_output = chain.invoke({"query": query, "search_results": search_results})
-            
-            logger.info("LLM processing completed. Parsing results...")
-            
-            parsed_output = self._parse_research_note(raw_output)
+            parsed_output = await self._generate_structured_note(query, search_results)
+            if parsed_output is None:
+                raw_output = await self._generate_text_note(query, search_results)
+                
+                logger.info("LLM processing completed. Parsing results...")
+                
+                parsed_output = self._parse_research_note(raw_output, search_results)
             self._validate_research_output(parsed_output)
             
+            if use_cache:
+                await asyncio.to_thread(self._cache_store, query, embedding, parsed_output)
+            
             logger.info(f"Research completed successfully for query: {query}")
             return parsed_output
 
@@ -151,7 +489,398 @@ class ResearchAgent:
             logger.error(f"Research failed for query '{query}': {e}")
             raise
 
-    def _parse_research_note(self, raw_text: str) -> Dict:
+    async def _generate_structured_note(self, query: str, search_results: str) -> Optional[Dict]:
+        """
+        Ask Gemini for a research note matching the ResearchNote schema.
+        
+        Returns None if the model output does not validate, so the caller can
+        fall back to the free-text format.
+        """
+        try:
+            note = await self.structured_chain.ainvoke({"query": query, "search_results": search_results})
+        except (ValidationError, OutputParserException) as e:
+            logger.warning(f"Structured output did not validate, falling back to text parsing: {e}")
+            return None
+        
+        if note is None:
+            logger.warning("No structured output returned, falling back to text parsing")
+            return None
+        
+        logger.info("LLM processing completed with structured output")
+        
+        result = note.model_dump()
+        sources = []
+        for source in result["sources"]:
+            source["url"] = self._normalize_source_url(source["url"])
+            if len(source["title"]) > 3:
+                sources.append(source)
+        if len(sources) < 3:
+            sources = self._extract_sources_from_search(sources, search_results)
+        result["sources"] = sources
+        return result
+
+    async def _generate_text_note(self, query: str, search_results: str) -> str:
+        """Stream a free-text research note, stopping at the prompt-echo markers."""
+        note = _NoteStream()
+        async with aclosing(self.chain.astream({"query": query, "search_results": search_results})) as stream:
+            async for chunk in stream:
+                note.feed(chunk)
+                if note.stopped:
+                    break
+        return note.text
+
+    def run_research_batch(self, queries: List[str], use_cache: bool = True) -> List[Dict]:
+        """Synchronous wrapper around arun_research_batch."""
+        return self._run_sync(self._arun_research_batch(queries, use_cache, BATCH_POLL_INTERVAL, BATCH_TIMEOUT))
+
+    async def arun_research_batch(self, queries: List[str], use_cache: bool = True,
+                                  poll_interval: float = BATCH_POLL_INTERVAL,
+                                  timeout: float = BATCH_TIMEOUT) -> List[Dict]:
+        """
+        Research several queries with a single Gemini batch job.
+        
+        Searches run concurrently, then every rendered prompt is submitted as
+        one inline batch request and the job is polled until it completes.
+        Batch jobs trade latency for cost, so this is meant for offline use.
+        Results are returned in the same order as the queries.
+        """
+        return await self._run_on_loop(self._arun_research_batch(queries, use_cache, poll_interval, timeout))
+
+    async def _arun_research_batch(self, queries: List[str], use_cache: bool,
+                                   poll_interval: float, timeout: float) -> List[Dict]:
+        """Run batch research on the agent loop."""
+        if len(queries) == 1:
+            return [await self._arun_research(queries[0], use_cache=use_cache)]
+        
+        for query in queries:
+            if not query or not query.strip():
+                raise ValueError("Query cannot be empty")
+        
+        logger.info(f"Starting batch research for {len(queries)} queries")
+        
+        results: List[Optional[Dict]] = [None] * len(queries)
+        embeddings = {}
+        pending = []
+        for i, query in enumerate(queries):
+            if use_cache:
+                cached, embedding = await asyncio.to_thread(self._cache_lookup, query)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+                embeddings[i] = embedding
+            pending.append(i)
+        
+        if pending:
+            logger.info(f"Performing {len(pending)} web searches...")
+            all_search_results = await asyncio.gather(*(self._search(queries[i]) for i in pending))
+            
+            prompts = {}
+            search_results_by_index = {}
+            for i, search_results in zip(pending, all_search_results):
+                if not search_results or str(search_results).strip() == "":
+                    logger.warning(f"No search results found for query: {queries[i]}")
+                    results[i] = self._create_empty_result(queries[i], "No search results found for this query.")
+                    continue
+                search_results_by_index[i] = search_results
+                prompts[i] = self.research_user_prompt.format(
+                    query=queries[i], search_results=search_results
+                )
+            
+            if prompts:
+                raw_outputs = await self._run_gemini_batch(list(prompts.values()), poll_interval, timeout)
+                
+                for i, raw_output in zip(prompts, raw_outputs):
+                    if raw_output is None:
+                        results[i] = self._create_empty_result(queries[i], "LLM processing failed for this query.")
+                        continue
+                    parsed_output = self._parse_research_note(raw_output, search_results_by_index[i])
+                    self._validate_research_output(parsed_output)
+                    if use_cache:
+                        await asyncio.to_thread(self._cache_store, queries[i], embeddings[i], parsed_output)
+                    results[i] = parsed_output
+        
+        logger.info(f"Batch research completed for {len(queries)} queries")
+        return results
+
+    async def _run_gemini_batch(self, prompts: List[str], poll_interval: float,
+                                timeout: float) -> List[Optional[str]]:
+        """Submit prompts as one inline Gemini batch job and wait for the responses."""
+        requests = [
+            {
+                "contents": [{"parts": [{"text": prompt}], "role": "user"}],
+                "config": {
+                    "system_instruction": self.research_system_prompt,
+                    "temperature": 0.1,
+                    "max_output_tokens": MAX_OUTPUT_TOKENS,
+                    "stop_sequences": list(_STOP_TOKENS),
+                },
+            }
+            for prompt in prompts
+        ]
+        
+        job = await asyncio.to_thread(
+            self.batch_client.batches.create,
+            model=GEMINI_MODEL,
+            src=requests,
+            config={"display_name": "research-batch"},
+        )
+        logger.info(f"Submitted Gemini batch job {job.name} with {len(prompts)} requests")
+        
+        elapsed = 0.0
+        while job.state.name not in BATCH_COMPLETED_STATES:
+            if elapsed >= timeout:
+                await asyncio.to_thread(self.batch_client.batches.cancel, name=job.name)
+                raise TimeoutError(f"Gemini batch job {job.name} did not finish within {timeout} seconds")
+            await asyncio.sleep(poll_interval)
+            elapsed += poll_interval
+            job = await asyncio.to_thread(self.batch_client.batches.get, name=job.name)
+        
+        if job.state.name != "JOB_STATE_SUCCEEDED":
+            raise RuntimeError(f"Gemini batch job {job.name} ended with state {job.state.name}")
+        
+        outputs = []
+        for inline_response in job.dest.inlined_responses:
+            if inline_response.response is not None:
+                outputs.append(inline_response.response.text)
+            else:
+                logger.warning(f"Gemini batch request failed: {inline_response.error}")
+                outputs.append(None)
+        return outputs
+
+    def _cache_lookup(self, query: str) -> Tuple[Optional[Dict], Optional[np.ndarray]]:
+        """
+        Look up a query in the in-process caches, then the persistent cache.
+        
+        Returns the cached result (or None on a miss) together with the query
+        embedding needed to store a fresh result.
+        """
+        key = cache_key(query)
+        with self._cache_lock:
+            cached = self._exact_cache.get(key)
+            if cached is not None:
+                self._exact_cache.move_to_end(key)
+                self.cache_stats["exact_hits"] += 1
+        if cached is not None:
+            logger.info(f"Exact cache hit for query: {query}")
+            return copy.deepcopy(cached), None
+        
+        embedding = self._embed_query(query)
+        cached = self._semantic_lookup(query, embedding)
+        if cached is not None:
+            self._count_cache_event("semantic_hits")
+            logger.info(f"Semantic cache hit for query: {query}")
+            return copy.deepcopy(cached), embedding
+        
+        if self.cache is not None:
+            cached = self.cache.get(query, embedding)
+            if cached is not None:
+                self._count_cache_event("persistent_hits")
+                logger.info(f"Persistent cache hit for query: {query}")
+                self._cache_store(query, embedding, cached, persist=False)
+                return cached, embedding
+        
+        self._count_cache_event("misses")
+        return None, embedding
+
+    def _count_cache_event(self, name: str) -> None:
+        """Increment one of the cache_stats counters."""
+        with self._cache_lock:
+            self.cache_stats[name] += 1
+
+    def search_web(self, query: str) -> str:
+        """Synchronously run the merged web search used for research."""
+        return self._run_sync(self._search(query))
+
+    def search_serpapi(self, query: str) -> Dict:
+        """Synchronously fetch SerpAPI's raw response for a query."""
+        return self._run_sync(self.search.aresults(query))
+
+    async def _search(self, query: str) -> str:
+        """
+        Query every search backend concurrently and merge their hits.
+        
+        Hits are interleaved across backends, deduplicated by link and capped
+        at MAX_SEARCH_HITS. A backend that fails or takes longer than
+        SEARCH_BACKEND_TIMEOUT seconds is skipped unless all of them fail.
+        """
+        responses = await asyncio.gather(
+            *(asyncio.wait_for(backend(query), SEARCH_BACKEND_TIMEOUT) for backend in self.search_backends),
+            return_exceptions=True
+        )
+        
+        hit_lists = []
+        for backend, response in zip(self.search_backends, responses):
+            if isinstance(response, Exception):
+                logger.warning(f"Search backend {backend.__name__} failed: {response!r}")
+            else:
+                hit_lists.append(response)
+        if not hit_lists:
+            raise responses[0]
+        
+        hits = []
+        seen = set()
+        for rank in range(max(len(hit_list) for hit_list in hit_lists)):
+            for hit_list in hit_lists:
+                if rank >= len(hit_list):
+                    continue
+                hit = hit_list[rank]
+                key = hit.get("link") or hit.get("snippet")
+                if key and key not in seen:
+                    seen.add(key)
+                    hits.append(hit)
+        
+        return self._format_search_hits(hits[:MAX_SEARCH_HITS])
+
+    async def _serp_search(self, query: str) -> List[Dict]:
+        """
+        Search with SerpAPI, keeping the title, link and snippet of organic results.
+        
+        Responses without organic results fall back to the answer box or
+        knowledge graph summary as a single snippet.
+        """
+        results = await self.search.aresults(query)
+        if "error" in results:
+            raise ValueError(f"Got error from SerpAPI: {results['error']}")
+        
+        organic_results = results.get("organic_results") or []
+        if organic_results:
+            return [
+                {"title": item.get("title", ""), "link": item.get("link", ""), "snippet": item.get("snippet", "")}
+                for item in organic_results
+            ]
+        
+        summary = self._flatten_search_results(self._serp_summary(results))
+        return [{"title": "", "link": "", "snippet": summary}] if summary else []
+
+    @staticmethod
+    def _serp_summary(results: Dict):
+        """Pick the answer box or knowledge graph summary from a SerpAPI response."""
+        answer_box = results.get("answer_box_list") or results.get("answer_box") or {}
+        if isinstance(answer_box, list):
+            return answer_box
+        
+        for field in ("answer", "snippet", "snippet_highlighted_words"):
+            if answer_box.get(field):
+                return answer_box[field]
+        
+        knowledge_graph = results.get("knowledge_graph") or {}
+        return knowledge_graph.get("description", "")
+
+    async def _ddg_search(self, query: str) -> List[Dict]:
+        """Search with DuckDuckGo, which needs no API key."""
+        return await asyncio.to_thread(self.ddg_search.results, query, MAX_SEARCH_HITS)
+
+    @staticmethod
+    def _format_search_hits(hits: List[Dict]) -> str:
+        """
+        Render search hits as the text injected into the prompt.
+        
+        Each hit becomes one whitespace-collapsed "title - snippet - link" line.
+        Hits that would take the text past MAX_SEARCH_RESULTS_CHARS are dropped
+        whole, so a link is never cut off part way through. If no hit fits, the
+        first one is kept with its snippet shortened instead.
+        """
+        def render(hit: Dict) -> str:
+            return _WHITESPACE_RE.sub(" ", _format_hit(hit)).strip()
+        
+        entries = []
+        length = -1
+        for hit in hits:
+            entry = render(hit)
+            if length + len(entry) + 1 > MAX_SEARCH_RESULTS_CHARS:
+                continue
+            length += len(entry) + 1
+            entries.append(entry)
+        
+        if not entries and hits:
+            room = MAX_SEARCH_RESULTS_CHARS - len(render(dict(hits[0], snippet=""))) - len(" - ")
+            snippet = str(hits[0].get("snippet", ""))[:max(room, 0)]
+            entries.append(render(dict(hits[0], snippet=snippet))[:MAX_SEARCH_RESULTS_CHARS])
+        return "\n".join(entries)
+
+    @staticmethod
+    def _flatten_search_results(search_results) -> str:
+        """
+        Convert SerpAPI summary output to a single string.
+        
+        Strings are returned unchanged. List items that are result dicts keep
+        only their title, snippet and link rather than their full repr.
+        """
+        if isinstance(search_results, str):
+            return search_results
+        
+        parts = []
+        for item in search_results:
+            part = _format_hit(item) if isinstance(item, dict) else str(item)
+            if part:
+                parts.append(part)
+        return "\n".join(parts)
+
+    def _embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query for the semantic cache, or return None if unavailable."""
+        if self._embedder is None:
+            return None
+        
+        try:
+            return self._embedder.encode(query.strip().lower(), normalize_embeddings=True)
+        except Exception as e:
+            logger.warning(f"Failed to embed query for semantic cache: {e}")
+            return None
+
+    def _semantic_lookup(self, query: str, embedding: Optional[np.ndarray]) -> Optional[Dict]:
+        """
+        Return the cached result most similar to the embedding, if close enough.
+        
+        Candidates above the similarity threshold must also pass
+        verify_semantic_match against the cached query and title.
+        """
+        if embedding is None:
+            return None
+        
+        match = self._sem_index.nearest(embedding)
+        if match is None:
+            return None
+        
+        label, similarity = match
+        if similarity < SEMANTIC_CACHE_THRESHOLD:
+            return None
+        
+        with self._cache_lock:
+            entry = self._sem_results.get(label)
+        if entry is None:
+            return None
+        
+        cached_query, result = entry
+        if not verify_semantic_match(query, cached_query, result):
+            self._count_cache_event("verified_rejects")
+            logger.info(f"Rejected semantic cache candidate '{cached_query}' for query: {query}")
+            return None
+        return result
+
+    def _cache_store(self, query: str, embedding: Optional[np.ndarray], result: Dict,
+                     persist: bool = True) -> None:
+        """Store a successful research result in every cache tier."""
+        if persist and self.cache is not None:
+            self.cache.put(query, embedding, result)
+        
+        result = copy.deepcopy(result)
+        key = cache_key(query)
+        with self._cache_lock:
+            self._exact_cache[key] = result
+            self._exact_cache.move_to_end(key)
+            if len(self._exact_cache) > CACHE_MAX_ENTRIES:
+                self._exact_cache.popitem(last=False)
+            
+            if embedding is not None:
+                if len(self._sem_results) >= CACHE_MAX_ENTRIES:
+                    oldest, _ = self._sem_results.popitem(last=False)
+                    self._sem_index.remove(oldest)
+                label = self._next_label
+                self._next_label += 1
+                self._sem_index.add(embedding, label)
+                self._sem_results[label] = (query, result)
+
+    def _parse_research_note(self, raw_text: str, search_results: Optional[str] = None) -> Dict:
         """Parse the raw LLM output into a structured format."""
         try:
             title = "Research Results"
@@ -174,22 +903,27 @@ class ResearchAgent:
 
             for line in lines:
                 line = line.strip()
+                head = line[:_SECTION_HEAD_LEN].upper()
+                header = next(
+                    (section for token, section in _SECTION_TOKENS.items() if head.startswith(token)),
+                    None
+                )
                 
-                if line.upper().startswith("TITLE:"):
+                if header == "title":
                     title = line.replace("TITLE:", "").replace("title:", "").strip()
                     current_section = "title"
-                elif line.upper().startswith("SUMMARY:"):
+                elif header == "summary":
                     current_section = "summary"
                     summary_lines = []
-                elif line.upper().startswith("KEY POINTS:"):
+                elif header == "key_points":
                     current_section = "key_points"
                     if summary_lines:
                         summary = " ".join(summary_lines).strip()
-                elif line.upper().startswith("SOURCES:"):
+                elif header == "sources":
                     current_section = "sources"
                     if summary_lines and summary == "No summary available":
                         summary = " ".join(summary_lines).strip()
-                elif line.upper().startswith("IMPORTANT GUIDELINES:") or line.upper().startswith("CRITICAL"):
+                elif head.startswith(_STOP_TOKENS):
                     if summary_lines and summary == "No summary available":
                         summary = " ".join(summary_lines).strip()
                     break
@@ -211,8 +945,8 @@ class ResearchAgent:
                 summary = summary.replace("SUMMARY:", "").strip()
 
             # Try to extract more sources from search results if needed
-            if len(sources) < 3 and hasattr(self, '_current_search_results'):
-                sources = self._extract_sources_from_search(sources)
+            if len(sources) < 3 and search_results:
+                sources = self._extract_sources_from_search(sources, search_results)
 
             return {
                 "title": title,
@@ -254,13 +988,7 @@ class ResearchAgent:
             else:
                 source_title = content.strip()
             
-            if source_url:
-                source_url = source_url.replace(' ', '')
-                if not source_url.startswith(('http://', 'https://')):
-                    if '.' in source_url:
-                        source_url = 'https://' + source_url
-                    else:
-                        source_url = ""
+            source_url = self._normalize_source_url(source_url)
             
             if source_title and len(source_title) > 3:
                 return {"title": source_title, "url": source_url}
@@ -271,31 +999,40 @@ class ResearchAgent:
             logger.warning(f"Could not parse source line: '{line}'. Error: {e}")
             return None
 
-    def _extract_sources_from_search(self, existing_sources: List[Dict]) -> List[Dict]:
+    @staticmethod
+    def _normalize_source_url(url: str) -> str:
+        """Strip spaces and add a missing scheme, or return "" if not a URL."""
+        if not url:
+            return ""
+        
+        url = url.replace(' ', '')
+        if not url.startswith(('http://', 'https://')):
+            if '.' in url:
+                return 'https://' + url
+            return ""
+        return url
+
+    def _extract_sources_from_search(self, existing_sources: List[Dict], search_results: str) -> List[Dict]:
         """Extract additional sources from search results."""
         try:
-            search_results = self._current_search_results
-            url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+(?:[^\s<>"{}|\\^`\[\]]*[a-zA-Z0-9])?'
-            found_urls = re.findall(url_pattern, str(search_results))
+            seen = {s.get('url', '') for s in existing_sources}
+            sources = list(existing_sources)
             
-            existing_urls = {s.get('url', '') for s in existing_sources}
-            
-            for url in found_urls:
-                if url in existing_urls or len(url) < 15:
+            for match in _URL_RE.finditer(str(search_results)):
+                url = match.group()
+                if url in seen or not self._is_valid_url(url):
                     continue
-                if not self._is_valid_url(url):
+                
+                domain_match = _DOMAIN_RE.match(url)
+                if not domain_match:
                     continue
-                    
-                domain_match = re.search(r'https?://(?:www\.)?([^/]+)', url)
-                if domain_match:
-                    title = f"Article from {domain_match.group(1)}"
-                    existing_sources.append({"title": title, "url": url})
-                    existing_urls.add(url)
-                    
-                if len(existing_sources) >= 5:
+                
+                sources.append({"title": f"Article from {domain_match.group(1)}", "url": url})
+                seen.add(url)
+                if len(sources) >= 5:
                     break
                     
-            return existing_sources
+            return sources
             
         except Exception as e:
             logger.warning(f"Failed to extract sources from search results: {e}")
@@ -320,23 +1057,14 @@ class ResearchAgent:
     
     def _is_valid_url(self, url: str) -> bool:
         """Validate if a URL is properly formatted."""
-        try:
-            url_pattern = r'^https?://[^\s<>"{}|\\^`\[\]]+\.[a-zA-Z]{2,}'
-            if not re.match(url_pattern, url):
-                return False
-            
-            invalid_patterns = ['example.com', 'placeholder', 'no%20url']
-            for pattern in invalid_patterns:
-                if pattern in url.lower():
-                    return False
-            
-            if len(url) < 15 or len(url) > 500:
-                return False
-            
-            return True
-            
-        except Exception:
+        if len(url) < 15 or len(url) > 500:
             return False
+        
+        url_lower = url.lower()
+        if any(token in url_lower for token in _BAD_URL_TOKENS):
+            return False
+        
+        return bool(_VALID_URL_RE.match(url))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+from typing import Dict
+import aiohttp
+
+SERPAPI_URL = "https://serpapi.com/search.json"
+SERPAPI_HOME = "https://serpapi.com/"
+
+
+class SerpAPIClient:
+    """
+    Minimal asynchronous SerpAPI client.
+
+    One aiohttp session is reused for every request so TLS handshakes and
+    DNS lookups are paid once per connection rather than once per search.
+    The session is created on first use and is bound to the event loop that
+    created it, so a client should only be used from a single loop.
+    """
+
+    def __init__(self, api_key: str, engine: str = "google", timeout: float = 30):
+        self.api_key = api_key
+        self.params = {
+            "engine": engine,
+            "google_domain": "google.com",
+            "gl": "us",
+            "hl": "en",
+        }
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it on the running loop if needed."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def aresults(self, query: str) -> Dict:
+        """Run a search and return SerpAPI's raw JSON response."""
+        params = {**self.params, "q": query, "api_key": self.api_key}
+        async with self._get_session().get(SERPAPI_URL, params=params) as response:
+            return await response.json(content_type=None)
+
+    async def warmup(self) -> None:
+        """Open a pooled connection to SerpAPI ahead of the first search."""
+        async with self._get_session().head(SERPAPI_HOME) as response:
+            await response.release()
+
+    async def close(self) -> None:
+        """Close the shared session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -1,13 +1,16 @@
 import pytest
+import asyncio
 import os
 import sys
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, AsyncMock, patch, MagicMock
 from datetime import datetime
+import numpy as np
+from langchain_core.runnables import RunnableLambda
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from research_agent import ResearchAgent
+from research_agent import ResearchAgent, ResearchNote, MAX_SEARCH_RESULTS_CHARS, _NoteStream, find_urls
 
 
 class TestResearchAgent:
@@ -40,7 +43,7 @@ class TestResearchAgent:
     def research_agent(self, mock_env_vars):
         """Create a ResearchAgent instance for testing."""
         with patch('research_agent.ChatOpenAI') as mock_openai, \
-             patch('research_agent.SerpAPIWrapper') as mock_serpapi:
+             patch('research_agent.SerpAPIClient') as mock_serpapi:
             
             mock_openai.return_value = Mock()
             mock_serpapi.return_value = Mock()
@@ -51,7 +54,7 @@ class TestResearchAgent:
     def test_initialization_success(self, mock_env_vars):
         """Test successful initialization of ResearchAgent."""
         with patch('research_agent.ChatOpenAI') as mock_openai, \
-             patch('research_agent.SerpAPIWrapper') as mock_serpapi:
+             patch('research_agent.SerpAPIClient') as mock_serpapi:
             
             mock_openai.return_value = Mock()
             mock_serpapi.return_value = Mock()
@@ -205,7 +208,7 @@ class TestResearchAgent:
         """Test fallback to Gemini when OpenAI fails."""
         with patch('research_agent.ChatOpenAI') as mock_openai, \
              patch('research_agent.ChatGoogleGenerativeAI') as mock_gemini, \
-             patch('research_agent.SerpAPIWrapper') as mock_serpapi:
+             patch('research_agent.SerpAPIClient') as mock_serpapi:
             
             # Mock OpenAI to fail
             mock_openai.side_effect = Exception("OpenAI API error")
@@ -237,6 +240,358 @@ class TestResearchAgent:
             assert mock_logger_instance.error.called is False  # No errors in this test
 
 
+class TestResearchAgentCache:
+    """Test cases for the ResearchAgent response cache."""
+    
+    RAW_NOTE = """
+    TITLE: Cached Research Title
+    
+    SUMMARY:
+    A summary that should only be generated once.
+    
+    KEY POINTS:
+    - A key point that is long enough to keep
+    """
+    
+    STRUCTURED_NOTE = ResearchNote(
+        title="Cached Research Title",
+        summary="A structured summary.",
+        key_points=["A key point that is long enough to keep"],
+        sources=[]
+    )
+    
+    @pytest.fixture
+    def llm(self):
+        """Fake Gemini model returning a structured note, or RAW_NOTE as text."""
+        llm = Mock()
+        llm.with_structured_output.return_value = RunnableLambda(lambda _: self.STRUCTURED_NOTE)
+        llm.bind.return_value = RunnableLambda(lambda _: self.RAW_NOTE)
+        return llm
+    
+    @pytest.fixture
+    def agent(self, llm):
+        """Create a ResearchAgent with mocked Gemini and SerpAPI clients."""
+        with patch.dict(os.environ, {
+            'GOOGLE_API_KEY': 'test_google_key',
+            'SERPAPI_API_KEY': 'test_serpapi_key'
+        }), patch('research_agent.ChatGoogleGenerativeAI', return_value=llm), \
+             patch('research_agent.SerpAPIClient'), \
+             patch('research_agent.DuckDuckGoSearchAPIWrapper'), \
+             patch('research_agent.genai'), \
+             patch('research_agent.get_embedder', return_value=None):
+            agent = ResearchAgent()
+        
+        agent.search.aresults = AsyncMock(return_value={
+            "organic_results": [{
+                "title": "AI research",
+                "link": "https://www.nature.com/articles/ai-research",
+                "snippet": "Search results"
+            }]
+        })
+        agent.search.close = AsyncMock()
+        agent.ddg_search.results.return_value = []
+        yield agent
+        agent.close()
+    
+    def test_exact_cache_hit_skips_search(self, agent):
+        """Test repeated queries are served from the exact-match cache."""
+        first = agent.run_research("Latest AI research")
+        second = agent.run_research("  latest ai research ")
+        
+        assert first == second
+        assert agent.search.aresults.await_count == 1
+        assert agent.cache_stats["exact_hits"] == 1
+        assert agent.cache_stats["misses"] == 1
+    
+    def test_structured_output_adds_sources_from_search(self, agent):
+        """Test structured notes are returned directly, topped up with search-result sources."""
+        result = agent.run_research("Latest AI research")
+        
+        assert result["summary"] == "A structured summary."
+        assert result["sources"] == [{
+            "title": "Article from nature.com",
+            "url": "https://www.nature.com/articles/ai-research"
+        }]
+    
+    def test_invalid_structured_output_falls_back_to_text(self, agent):
+        """Test a schema validation failure falls back to parsing the text format."""
+        agent.llm.with_structured_output.return_value = RunnableLambda(
+            lambda _: ResearchNote.model_validate({"title": "Missing fields"})
+        )
+        agent._initialize_prompts()
+        
+        result = agent.run_research("Latest AI research")
+        
+        assert result["title"] == "Cached Research Title"
+        assert result["summary"] == "A summary that should only be generated once."
+        assert result["key_points"] == ["A key point that is long enough to keep"]
+    
+    def test_use_cache_false_bypasses_cache(self, agent):
+        """Test use_cache=False always performs a live search."""
+        agent.run_research("Latest AI research", use_cache=False)
+        agent.run_research("Latest AI research", use_cache=False)
+        
+        assert agent.search.aresults.await_count == 2
+        assert agent.cache_stats["misses"] == 0
+    
+    def test_run_research_many_preserves_order(self, agent):
+        """Test concurrent research returns one result per query, in order."""
+        agent.structured_chain = RunnableLambda(lambda inputs: ResearchNote(
+            title=f"Research on {inputs['query']}",
+            summary="A structured summary.",
+            key_points=[],
+            sources=[]
+        ))
+        queries = ["first query", "second query", "third query"]
+        
+        results = agent.run_research_many(queries)
+        
+        assert [r["title"] for r in results] == [f"Research on {query}" for query in queries]
+        assert agent.search.aresults.await_count == 3
+    
+    def test_warmup_pings_gemini_and_serpapi(self, agent, llm):
+        """Test the warmup makes a one-token Gemini call and opens a SerpAPI connection."""
+        ping = Mock(ainvoke=AsyncMock())
+        llm.bind.side_effect = lambda **kwargs: ping
+        agent.search.warmup = AsyncMock()
+        
+        agent._run_sync(agent._warmup())
+        
+        llm.bind.assert_called_with(generation_config={"max_output_tokens": 1})
+        ping.ainvoke.assert_awaited_once_with("ping")
+        agent.search.warmup.assert_awaited_once()
+    
+    def test_warmup_failure_does_not_break_construction(self, agent, caplog):
+        """Test a failing warmup is logged and the agent still works."""
+        agent._warmup_future.result(timeout=5)
+        agent.search.warmup = AsyncMock(side_effect=OSError("unreachable"))
+        
+        agent._run_sync(agent._warmup())
+        
+        assert "SerpAPI warmup failed: unreachable" in caplog.text
+        assert agent.run_research("Latest AI research")["title"] == "Cached Research Title"
+    
+    def test_arun_research_from_another_loop(self, agent):
+        """Test awaiting arun_research from a caller's loop runs the work on the agent loop."""
+        search_loops = []
+        
+        async def aresults(query):
+            search_loops.append(asyncio.get_running_loop())
+            return {"organic_results": [{"title": "AI research", "link": "https://www.nature.com/articles/ai-research",
+                                         "snippet": "Search results"}]}
+        
+        agent.search.aresults = aresults
+        
+        result = asyncio.run(agent.arun_research("Latest AI research"))
+        
+        assert result["title"] == "Cached Research Title"
+        assert search_loops == [agent._loop]
+    
+    def test_run_research_batch_single_job(self, agent):
+        """Test batch research submits one Gemini batch job for all cache misses."""
+        agent.run_research("cached query")
+        
+        job = Mock()
+        job.name = "batches/test"
+        job.state.name = "JOB_STATE_SUCCEEDED"
+        job.dest.inlined_responses = [
+            Mock(response=Mock(text=self.RAW_NOTE)),
+            Mock(response=None, error="quota exceeded"),
+        ]
+        agent.batch_client.batches.create.return_value = job
+        
+        results = agent.run_research_batch(["first query", "cached query", "second query"])
+        
+        assert len(results) == 3
+        assert results[0]["title"] == "Cached Research Title"
+        assert results[1]["title"] == "Cached Research Title"
+        assert "LLM processing failed" in results[2]["summary"]
+        agent.batch_client.batches.create.assert_called_once()
+        assert len(agent.batch_client.batches.create.call_args.kwargs["src"]) == 2
+    
+    def test_stream_research_yields_partial_and_final_results(self, agent):
+        """Test a partial result is yielded as each section starts, then the parsed note."""
+        agent.chain = Mock()
+        agent.chain.stream.return_value = iter([
+            "TITLE: Streamed Title\n",
+            "SUMMARY:\nA streamed summary sentence.\n",
+            "KEY POINTS:\n- A key point that is long enough\n",
+        ])
+        
+        events = list(agent.stream_research("Streamed query"))
+        
+        assert [event["done"] for event in events] == [False, False, False, True]
+        assert events[0]["result"]["title"] == "Streamed Title"
+        final = events[-1]["result"]
+        assert final["summary"] == "A streamed summary sentence."
+        assert final["key_points"] == ["A key point that is long enough"]
+        assert final["sources"][0]["url"] == "https://www.nature.com/articles/ai-research"
+    
+    def test_stream_research_cache_hit(self, agent):
+        """Test a cached query yields a single done event without searching again."""
+        cached = agent.run_research("Latest AI research")
+        
+        events = list(agent.stream_research("latest ai research"))
+        
+        assert events == [{"done": True, "result": cached}]
+        assert agent.search.aresults.await_count == 1
+    
+    def test_search_keeps_fields_and_truncates(self, agent):
+        """Test only title, snippet and link are kept and hits over the cap are dropped whole."""
+        agent.search.aresults.return_value = {"organic_results": [
+            {"title": "Title  one", "link": "https://a.io/1", "snippet": "Snippet\n text", "position": 1},
+            {"title": "Title two", "link": "https://a.io/2", "snippet": "x" * 2000},
+            {"title": "Title three", "link": "https://www.nature.com/articles/3", "snippet": "y" * 2000},
+        ]}
+        
+        formatted = agent.search_web("query")
+        
+        assert formatted.split("\n")[0] == "Title one - Snippet text - https://a.io/1"
+        assert formatted.endswith(" - https://a.io/2")
+        assert "nature.com" not in formatted
+        assert "position" not in formatted
+        assert len(formatted) <= MAX_SEARCH_RESULTS_CHARS
+    
+    def test_search_keeps_smaller_hits_after_an_oversized_one(self, agent):
+        """Test a hit over the cap is skipped without dropping the hits after it."""
+        agent.search.aresults.return_value = {"organic_results": [
+            {"title": "Short", "link": "https://a.io/1", "snippet": "s1"},
+            {"title": "Huge", "link": "https://a.io/2", "snippet": "x" * 5000},
+            {"title": "Also short", "link": "https://a.io/3", "snippet": "s3"},
+        ]}
+        
+        formatted = agent.search_web("query")
+        
+        assert formatted == "Short - s1 - https://a.io/1\nAlso short - s3 - https://a.io/3"
+    
+    def test_search_shortens_single_oversized_hit(self, agent):
+        """Test a lone hit over the cap keeps its title and link with a shortened snippet."""
+        agent.search.aresults.return_value = {"organic_results": [
+            {"title": "Answer", "link": "https://www.nature.com/articles/1", "snippet": "x" * 5000},
+        ]}
+        
+        formatted = agent.search_web("query")
+        
+        assert formatted.startswith("Answer - xxx")
+        assert formatted.endswith(" - https://www.nature.com/articles/1")
+        assert len(formatted) == MAX_SEARCH_RESULTS_CHARS
+    
+    def test_search_merges_backends(self, agent):
+        """Test hits from both backends are interleaved and deduplicated by link."""
+        agent.search.aresults.return_value = {"organic_results": [
+            {"title": "Serp one", "link": "https://a.io/1", "snippet": "s1"},
+            {"title": "Serp two", "link": "https://a.io/2", "snippet": "s2"},
+        ]}
+        agent.ddg_search.results.return_value = [
+            {"title": "Duck one", "link": "https://a.io/1", "snippet": "d1"},
+            {"title": "Duck two", "link": "https://b.io/2", "snippet": "d2"},
+        ]
+        
+        formatted = agent.search_web("query")
+        
+        assert [line.split(" - ")[0] for line in formatted.split("\n")] == ["Serp one", "Serp two", "Duck two"]
+    
+    def test_search_falls_back_to_answer_box(self, agent):
+        """Test responses without organic results use the answer box summary."""
+        agent.search.aresults.return_value = {"answer_box": {"answer": "Paris", "title": "Capital of France"}}
+        agent.ddg_search.results.return_value = []
+        
+        assert agent.search_web("query") == "Paris"
+    
+    def test_flatten_search_results(self, agent):
+        """Test strings pass through and list items keep only title, snippet and link."""
+        hit = {"title": "Title", "snippet": "Snippet", "link": "https://a.io/1", "position": 1}
+        
+        assert agent._flatten_search_results("plain text") == "plain text"
+        assert agent._flatten_search_results([hit, hit]) == (
+            "Title - Snippet - https://a.io/1\nTitle - Snippet - https://a.io/1"
+        )
+        assert agent._flatten_search_results(["first", {"snippet": "second"}, ""]) == "first\nsecond"
+    
+    def test_search_skips_failed_backend(self, agent):
+        """Test a failing backend does not fail the search."""
+        agent.ddg_search.results.side_effect = RuntimeError("rate limited")
+        
+        assert "nature.com" in agent.search_web("query")
+    
+    def test_search_skips_slow_backend(self, agent):
+        """Test a backend exceeding the timeout is abandoned."""
+        async def hung_search(query):
+            await asyncio.sleep(60)
+        
+        agent.search_backends = [agent.search_backends[0], hung_search]
+        with patch('research_agent.SEARCH_BACKEND_TIMEOUT', 0.05):
+            assert "nature.com" in agent.search_web("query")
+    
+    def test_semantic_cache_hit(self, agent):
+        """Test a sufficiently similar query embedding returns the cached result."""
+        agent._embedder = Mock()
+        agent._embedder.encode.side_effect = [
+            np.array([1.0, 0.0]),
+            np.array([0.99, 0.05]),
+        ]
+        
+        first = agent.run_research("Cached research on language models")
+        second = agent.run_research("Research on cached language models")
+        
+        assert first == second
+        assert agent.search.aresults.await_count == 1
+        assert agent.cache_stats["semantic_hits"] == 1
+    
+    def test_semantic_cache_rejects_unrelated_query(self, agent):
+        """Test an embedding-similar query about a different subject is not served from cache."""
+        agent._embedder = Mock()
+        agent._embedder.encode.side_effect = [
+            np.array([1.0, 0.0]),
+            np.array([0.99, 0.05]),
+        ]
+        
+        agent.run_research("Cached research on language models")
+        agent.run_research("Cached research on protein folding")
+        
+        assert agent.search.aresults.await_count == 2
+        assert agent.cache_stats["verified_rejects"] == 1
+
+
+class TestFindUrls:
+    """Test cases for URL extraction."""
+    
+    def test_find_urls_stops_at_terminators(self):
+        """Test URLs end at whitespace and characters invalid in URLs."""
+        text = 'see https://www.nature.com/a?b=1 and <http://arxiv.org/abs/1>, "https://x.io/p"[1]'
+        
+        assert find_urls(text) == [
+            "https://www.nature.com/a?b=1",
+            "http://arxiv.org/abs/1",
+            "https://x.io/p",
+        ]
+    
+    def test_find_urls_ignores_bare_scheme(self):
+        """Test text mentioning http without a URL body yields nothing."""
+        assert find_urls("http https:// httpx http:// ") == []
+
+
+class TestNoteStream:
+    """Test cases for incremental LLM output buffering."""
+    
+    def test_feed_reports_section_headers(self):
+        """Test a completed section header line is reported once."""
+        note = _NoteStream()
+        
+        assert note.feed("TITLE: Streamed") is False
+        assert note.feed(" Title\nSUMMARY:\nFirst") is True
+        assert note.feed(" sentence.") is False
+        assert note.text == "TITLE: Streamed Title\nSUMMARY:\nFirst sentence."
+    
+    def test_feed_stops_at_prompt_echo(self):
+        """Test output after a CRITICAL line is discarded."""
+        note = _NoteStream()
+        note.feed("KEY POINTS:\n- A point\nCRITICAL SOURCE FORMATTING RULES:\n- echoed")
+        
+        assert note.stopped is True
+        assert note.text == "KEY POINTS:\n- A point\n"
+
+
 class TestResearchAgentIntegration:
     """Integration tests for ResearchAgent."""
     
@@ -252,7 +607,7 @@ class TestResearchAgentIntegration:
     def test_full_research_pipeline(self, mock_environment):
         """Test the complete research pipeline."""
         with patch('research_agent.ChatOpenAI') as mock_openai, \
-             patch('research_agent.SerpAPIWrapper') as mock_serpapi, \
+             patch('research_agent.SerpAPIClient') as mock_serpapi, \
              patch('research_agent.LLMChain') as mock_chain:
             
             # Mock all components
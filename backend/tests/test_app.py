@@ -0,0 +1,56 @@
+import pytest
+import os
+import sys
+from unittest.mock import Mock, patch
+import orjson
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module
+
+
+class TestResearchStreamEndpoint:
+    """Test cases for the /research/stream SSE endpoint."""
+
+    @pytest.fixture
+    def client(self):
+        """Flask test client."""
+        return app_module.app.test_client()
+
+    def test_streams_events_and_saves_final_result(self, client):
+        """Test each agent event is sent as SSE data and the final result is saved."""
+        agent = Mock()
+        agent.stream_research.return_value = iter([
+            {"done": False, "result": {"title": "Partial"}},
+            {"done": True, "result": {"title": "Final"}},
+        ])
+        with patch.object(app_module, 'research_agent', agent), \
+             patch.object(app_module, 'save_research_query') as save:
+            response = client.get('/research/stream?query=test')
+            body = response.get_data(as_text=True)
+
+        assert response.mimetype == 'text/event-stream'
+        assert body.split("\n\n")[:2] == [
+            f"data: {orjson.dumps({'done': False, 'result': {'title': 'Partial'}}).decode()}",
+            f"data: {orjson.dumps({'done': True, 'result': {'title': 'Final'}}).decode()}",
+        ]
+        save.assert_called_once_with('test', {"title": "Final"})
+
+    def test_error_event_is_sent_and_saved(self, client):
+        """Test a failing stream emits an error event and records the error."""
+        agent = Mock()
+        agent.stream_research.side_effect = RuntimeError("LLM unavailable")
+        with patch.object(app_module, 'research_agent', agent), \
+             patch.object(app_module, 'save_research_query') as save:
+            body = client.get('/research/stream?query=test').get_data(as_text=True)
+
+        assert body.startswith("event: error\ndata: ")
+        assert "LLM unavailable" in body
+        save.assert_called_once_with(
+            'test', status='error', error_message="Failed to perform research: LLM unavailable"
+        )
+
+    def test_missing_query_is_rejected(self, client):
+        """Test the endpoint requires a query parameter."""
+        assert client.get('/research/stream').status_code == 400
@@ -0,0 +1,135 @@
+import pytest
+import os
+import sys
+import time
+from unittest.mock import patch
+import numpy as np
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import SemanticIndex, SqliteAnswerCache, cache_key, verify_semantic_match
+
+
+RESULT = {
+    "title": "Chip Export News Roundup",
+    "summary": "Cached summary",
+    "key_points": ["Cached key point"],
+    "sources": [{"title": "Source", "url": "https://www.nature.com/articles/x"}]
+}
+
+
+class TestVerifySemanticMatch:
+    """Test cases for the semantic hit verification."""
+
+    def test_accepts_reworded_query(self):
+        """Test a reordering of the same content words is accepted."""
+        assert verify_semantic_match("chip export news", "news about chip export", RESULT)
+
+    def test_rejects_different_subject(self):
+        """Test queries sharing phrasing but not subject are rejected."""
+        assert not verify_semantic_match("chip export news", "grain harvest news", RESULT)
+
+    def test_rejects_unrelated_title(self):
+        """Test the cached title must mention the query's subject."""
+        result = dict(RESULT, title="Research Results")
+        assert not verify_semantic_match("chip export news", "chip export news", result)
+
+
+class TestSemanticIndex:
+    """Test cases for the HNSW semantic index."""
+
+    def test_nearest_returns_label_and_similarity(self):
+        """Test the closest embedding is returned with its cosine similarity."""
+        index = SemanticIndex(capacity=2)
+        index.add(np.array([1.0, 0.0]), 7)
+        index.add(np.array([0.0, 1.0]), 8)
+
+        label, similarity = index.nearest(np.array([0.9, 0.1]))
+
+        assert label == 7
+        assert similarity == pytest.approx(0.9 / np.linalg.norm([0.9, 0.1]), abs=1e-5)
+
+    def test_removed_labels_are_not_returned(self):
+        """Test removed embeddings are skipped and their slots reused."""
+        index = SemanticIndex(capacity=1)
+        assert index.nearest(np.array([1.0, 0.0])) is None
+
+        index.add(np.array([1.0, 0.0]), 1)
+        index.remove(1)
+        assert index.nearest(np.array([1.0, 0.0])) is None
+
+        index.add(np.array([0.0, 1.0]), 2)
+        index.add(np.array([1.0, 1.0]), 3)
+        assert index.nearest(np.array([0.0, 1.0]))[0] == 2
+
+
+class TestSqliteAnswerCache:
+    """Test cases for the SQLite-backed answer cache."""
+
+    @pytest.fixture
+    def db_path(self, tmp_path):
+        """Path to a throwaway cache database."""
+        return str(tmp_path / "answer_cache.db")
+
+    def test_cache_key_normalizes_query(self):
+        """Test keys ignore case and surrounding whitespace."""
+        assert cache_key("  Latest AI News ") == cache_key("latest ai news")
+
+    def test_exact_hit(self, db_path):
+        """Test a stored result is returned for the same query."""
+        cache = SqliteAnswerCache(db_path)
+        cache.put("Latest AI news", None, RESULT)
+
+        assert cache.get("latest ai news") == RESULT
+        assert cache.get("unrelated query") is None
+        assert cache.stats == {"exact_hits": 1, "semantic_hits": 0, "verified_rejects": 0, "misses": 1}
+
+    def test_semantic_hit_shared_across_instances(self, db_path):
+        """Test embeddings persisted by one instance are loaded by another."""
+        SqliteAnswerCache(db_path).put("AI chip export news", np.array([1.0, 0.0]), RESULT)
+
+        cache = SqliteAnswerCache(db_path)
+
+        assert cache.get("news on AI chip exports controls", np.array([0.99, 0.05])) is None
+        assert cache.get("news about chip export", np.array([0.99, 0.05])) == RESULT
+        assert cache.get("cooking recipes", np.array([0.0, 1.0])) is None
+        assert cache.stats["verified_rejects"] == 1
+
+    def test_expired_rows_are_ignored_and_cleared(self, db_path):
+        """Test rows older than the TTL miss and are removed by clear_expired."""
+        cache = SqliteAnswerCache(db_path, ttl=60)
+        with patch('cache.time.time', return_value=time.time() - 120):
+            cache.put("Latest AI news", np.array([1.0, 0.0]), RESULT)
+
+        assert cache.get("Latest AI news") is None
+        assert cache.clear_expired() == 1
+
+    def test_replacing_a_key_does_not_grow_the_index(self, db_path):
+        """Test re-storing a query keeps one indexed label for it."""
+        cache = SqliteAnswerCache(db_path)
+        for _ in range(5):
+            cache.put("Latest AI news", np.array([1.0, 0.0]), RESULT)
+
+        assert len(cache._keys) == 1
+        assert cache.get("latest ai news", np.array([1.0, 0.0])) == RESULT
+
+    def test_expired_neighbour_does_not_hide_valid_match(self, db_path):
+        """Test an expired nearest row is skipped in favour of a valid one behind it."""
+        cache = SqliteAnswerCache(db_path, ttl=60)
+        with patch('cache.time.time', return_value=time.time() - 120):
+            cache.put("AI chip export news", np.array([1.0, 0.0]), dict(RESULT, summary="Stale"))
+        cache.put("news about chip export", np.array([0.95, 0.3]), RESULT)
+
+        assert cache.get("chip export news", np.array([1.0, 0.0])) == RESULT
+        assert len(cache._keys) == 1
+
+    def test_put_purges_expired_rows(self, db_path):
+        """Test put clears expired rows once the purge interval has passed."""
+        cache = SqliteAnswerCache(db_path, ttl=60, purge_interval=0)
+        with patch('cache.time.time', return_value=time.time() - 120):
+            cache.put("Old query", np.array([1.0, 0.0]), RESULT)
+        cache.put("New query", np.array([0.0, 1.0]), RESULT)
+
+        assert cache.clear_expired() == 0
+        assert len(cache._keys) == 1